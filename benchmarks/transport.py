@@ -0,0 +1,116 @@
+"""
+Description
+--------------------
+Benchmarks the default transports (requests and aiohttp, HTTP/1.1)
+against the HTTP/2 transport (httpx) with a local h2 server that
+imitates paginated items and single users.
+
+Requires hypercorn, httpx and h2, plus a certificate and key for
+localhost, e.g.:
+    openssl req -x509 -newkey rsa:2048 -nodes -days 1 -subj /CN=localhost
+        -addext subjectAltName=DNS:localhost
+        -keyout key.pem -out cert.pem
+
+Example Usage
+--------------------
+    python benchmarks/transport.py --certfile cert.pem --keyfile key.pem
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+
+
+def make_app(records, limit):
+    async def app(scope, receive, send):
+        if scope['type'] != 'http':
+            return
+        path = scope['path']
+        query = dict(pair.split('=', 1) for pair in
+                     scope['query_string'].decode().split('&') if pair)
+        if path == '/api/v1/items':
+            start = int(query.get('next', 0))
+            body = {'data': records[start:start + limit], 'links': {}}
+            if start + limit < len(records):
+                body['links']['next'] = {
+                    'href': '/api/v1/items?limit=%d&next=%d' % (
+                        limit, start + limit)}
+        else:
+            body = {'id': path.rsplit('/', 1)[-1], 'name': 'user'}
+        payload = json.dumps(body).encode()
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': [(b'content-type', b'application/json')]})
+        await send({'type': 'http.response.body', 'body': payload})
+    return app
+
+
+def start_server(app, port, certfile, keyfile):
+    config = Config()
+    config.bind = ['localhost:%d' % port]
+    config.certfile = certfile
+    config.keyfile = keyfile
+    config.alpn_protocols = ['h2', 'http/1.1']
+    config.accesslog = None
+    config.errorlog = None
+
+    def run():
+        asyncio.run(serve(app, config,
+                          shutdown_trigger=asyncio.Future))
+
+    threading.Thread(target=run, daemon=True).start()
+    time.sleep(1)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--certfile', required=True)
+    parser.add_argument('--keyfile', required=True)
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--records', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--chunks', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['SSL_CERT_FILE'] = args.certfile
+    os.environ['REQUESTS_CA_BUNDLE'] = args.certfile
+
+    # aiohttp builds its default ssl context on import
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+    from qsaas.qsaas import Tenant
+
+    records = [{'id': str(i), 'name': 'app' + str(i),
+                'resourceAttributes': {'description': 'x' * 500}}
+               for i in range(args.records)]
+    start_server(make_app(records, 100), args.port, args.certfile,
+                 args.keyfile)
+
+    q = Tenant(api_key='benchmark', tenant='localhost:%d' % args.port,
+               tenant_id='benchmark')
+    q.single_flight_ttl = 0
+    ids = [str(i) for i in range(args.users)]
+
+    for http2 in (False, True):
+        q.http2 = http2
+        name = 'http2 (httpx)' if http2 else 'http1 (requests/aiohttp)'
+
+        started = time.perf_counter()
+        items = q.get('items')
+        get_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        users = q.async_get('users', ids=ids, chunks=args.chunks)
+        async_time = time.perf_counter() - started
+
+        print('%-26s get: %d in %.2fs   async_get: %d in %.2fs' % (
+            name, len(items), get_time, len(users), async_time))
+
+
+if __name__ == '__main__':
+    main()
@@ -2,10 +2,557 @@ import re
 import requests
 from requests_toolbelt.multipart.encoder import MultipartEncoder
 import json
-from aiohttp import ClientSession
+from aiohttp import ClientSession, WSMsgType
 import asyncio
 import warnings
 import urllib
+import importlib
+import datetime
+import time
+import threading
+import bisect
+import itertools
+
+
+_RESULT_FORMATS = ('list', 'columns', 'numpy', 'pandas', 'arrow')
+_PRIORITIES = {'interactive': 0, 'background': 1}
+_ENGINE_LISTS = {
+    'sheets': ('qAppObjectList', {
+        'qInfo': {'qType': 'SheetList'},
+        'qAppObjectListDef': {
+            'qType': 'sheet',
+            'qData': {'title': '/qMetaDef/title',
+                      'description': '/qMetaDef/description'}}}),
+    'measures': ('qMeasureList', {
+        'qInfo': {'qType': 'MeasureList'},
+        'qMeasureListDef': {
+            'qType': 'measure',
+            'qData': {'title': '/qMetaDef/title',
+                      'tags': '/qMetaDef/tags',
+                      'measure': '/qMeasure'}}}),
+    'dimensions': ('qDimensionList', {
+        'qInfo': {'qType': 'DimensionList'},
+        'qDimensionListDef': {
+            'qType': 'dimension',
+            'qData': {'title': '/qMetaDef/title',
+                      'tags': '/qMetaDef/tags',
+                      'dimension': '/qDim'}}})
+}
+_ENGINE_OBJECTS = ('sheets', 'measures', 'dimensions', 'data_model',
+                   'script')
+
+
+def _check_priority(priority):
+    """
+    Description
+    --------------------
+    Raises if priority is not one of the rate limit priorities.
+    """
+
+    if priority not in _PRIORITIES:
+        raise Exception('priority must be one of', tuple(_PRIORITIES))
+
+
+def _next_cursor(body):
+    """
+    Description
+    --------------------
+    Returns the (param, value) pair for the next page of a
+    paginated response body, or None if it is the last page.
+    """
+
+    try:
+        links = body['links']
+        if 'next' in links:
+            href = links['next']['href']
+        else:
+            href = links['Next']['Href']
+    except (KeyError, TypeError):
+        return None
+
+    for name in ('next', 'startingAfter'):
+        cursor = re.findall(r'(?<=&' + name + r'=)(?:(?!&|$).)*', href)
+        if cursor:
+            return name, cursor[0]
+    return None
+
+
+def _isoformat(moment):
+    """
+    Description
+    --------------------
+    Formats a datetime the way the APIs expect, e.g.
+    2021-01-01T00:00:00.000Z. Naive datetimes are taken as UTC.
+    """
+
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(datetime.timezone.utc)
+    return (moment.strftime('%Y-%m-%dT%H:%M:%S.') +
+            '%03dZ' % (moment.microsecond // 1000))
+
+
+def _lookup(record, field):
+    """
+    Description
+    --------------------
+    Resolves a dotted field path, returning None if any part
+    of it is missing.
+    """
+
+    for key in field.split('.'):
+        if not isinstance(record, dict) or key not in record:
+            return None
+        record = record[key]
+    return record
+
+
+def _project(record, fields):
+    """
+    Description
+    --------------------
+    Returns a copy of record that only keeps the given dotted
+    field paths, preserving their nesting.
+    """
+
+    result = {}
+    for field in fields:
+        keys = field.split('.')
+        source = record
+        for key in keys:
+            if not isinstance(source, dict) or key not in source:
+                break
+            source = source[key]
+        else:
+            target = result
+            for key in keys[:-1]:
+                target = target.setdefault(key, {})
+            target[keys[-1]] = source
+    return result
+
+
+def _numpy_column(numpy, values):
+    """
+    Description
+    --------------------
+    Converts one page of a column to a numpy array, using an
+    object array for columns holding lists or dicts.
+    """
+
+    if all(value is None or isinstance(value, (str, int, float, bool))
+           for value in values):
+        return numpy.asarray(values)
+    column = numpy.empty(len(values), dtype=object)
+    column[:] = values
+    return column
+
+
+def _collect_columns(pages, fields, result_format):
+    """
+    Description
+    --------------------
+    Builds column-oriented output from an iterable of pages,
+    converting one page at a time so that the raw records of
+    only one page are held in memory at once.
+    """
+
+    if result_format != 'columns':
+        package = {'numpy': 'numpy', 'pandas': 'pandas',
+                   'arrow': 'pyarrow'}[result_format]
+        try:
+            module = importlib.import_module(package)
+        except ImportError:
+            raise Exception('result_format "' + result_format + '" '
+                            'requires the ' + package + ' package to be '
+                            'installed')
+
+    chunks = []
+    columns = {field: [] for field in fields}
+    for page in pages:
+        if not isinstance(page, list):
+            page = [page]
+        page_columns = {field: [_lookup(record, field) for record in page]
+                        for field in fields}
+        if result_format == 'columns':
+            for field in fields:
+                columns[field].extend(page_columns[field])
+        elif result_format == 'numpy':
+            chunks.append([_numpy_column(module, page_columns[field])
+                           for field in fields])
+        elif result_format == 'pandas':
+            chunks.append(module.DataFrame(page_columns,
+                                           columns=list(fields)))
+        else:
+            chunks.append(module.table(page_columns))
+
+    if result_format == 'columns':
+        return columns
+    elif result_format == 'numpy':
+        if not chunks:
+            chunks = [[module.asarray([]) for field in fields]]
+        return module.rec.fromarrays(
+            [module.concatenate([chunk[i] for chunk in chunks])
+             for i in range(len(fields))], names=list(fields))
+    elif result_format == 'pandas':
+        if not chunks:
+            return module.DataFrame(columns, columns=list(fields))
+        return module.concat(chunks, ignore_index=True)
+    else:
+        if not chunks:
+            return module.table(columns)
+        try:
+            return module.concat_tables(chunks, promote_options='permissive')
+        except TypeError:
+            return module.concat_tables(chunks, promote=True)
+
+
+def _import_httpx():
+    """
+    Description
+    --------------------
+    Imports httpx for the HTTP/2 transport, which is optional.
+    """
+
+    try:
+        httpx = importlib.import_module('httpx')
+        importlib.import_module('h2')
+    except ImportError:
+        raise Exception('http2 requires the httpx and h2 packages to be '
+                        'installed, e.g. pip install qsaas[http2]')
+    return httpx
+
+
+class _HTTPXSession:
+    """
+    Description
+    --------------------
+    Wraps an httpx.AsyncClient speaking HTTP/2 so that the async
+    functions can use it in place of an aiohttp ClientSession.
+    All requests are multiplexed over the client's connection.
+    """
+
+    def __init__(self, httpx):
+        self._client = httpx.AsyncClient(http2=True, timeout=None,
+                                         follow_redirects=True)
+
+    async def __aenter__(self):
+        await self._client.__aenter__()
+        return self
+
+    async def __aexit__(self, *args):
+        await self._client.__aexit__(*args)
+
+    def get(self, url, **kwargs):
+        return _HTTPXResponse(self._client, 'GET', url, kwargs)
+
+    def post(self, url, **kwargs):
+        return _HTTPXResponse(self._client, 'POST', url, kwargs)
+
+    def put(self, url, **kwargs):
+        return _HTTPXResponse(self._client, 'PUT', url, kwargs)
+
+    def patch(self, url, **kwargs):
+        return _HTTPXResponse(self._client, 'PATCH', url, kwargs)
+
+    def delete(self, url, **kwargs):
+        return _HTTPXResponse(self._client, 'DELETE', url, kwargs)
+
+
+class _HTTPXResponse:
+    """
+    Description
+    --------------------
+    The async context manager returned by _HTTPXSession, exposing
+    the status and text() of the response like aiohttp does.
+    """
+
+    def __init__(self, client, method, url, kwargs):
+        if 'data' in kwargs and not isinstance(kwargs['data'], dict):
+            kwargs['content'] = kwargs.pop('data')
+        self._client = client
+        self._method = method
+        self._url = url
+        self._kwargs = kwargs
+
+    async def __aenter__(self):
+        self._response = await self._client.request(
+            self._method, self._url, **self._kwargs)
+        self.status = self._response.status_code
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def text(self):
+        return self._response.text
+
+
+class _SingleFlight:
+    """
+    Description
+    --------------------
+    Coalesces concurrent identical async reads into one in-flight
+    call whose response is shared by every caller. Responses
+    are then memoized for a short ttl so that near-simultaneous
+    followers are served without a call either. Only calls made
+    within the same scope, i.e. session, are joined, and neither
+    calls nor responses from before the last write are reused.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._memo = {}
+        self._generation = 0
+        self.requests = 0
+        self.coalesced = 0
+        self.memo_hits = 0
+
+    async def do(self, key, call, ttl, scope):
+        self.requests += 1
+        if key in self._memo:
+            expiry, result = self._memo[key]
+            if expiry > time.monotonic():
+                self.memo_hits += 1
+                return result
+            del self._memo[key]
+
+        generation, task = self._calls.get((scope, key), (None, None))
+        if generation == self._generation:
+            self.coalesced += 1
+        else:
+            generation = self._generation
+            task = asyncio.ensure_future(call())
+            task.add_done_callback(
+                lambda task: self._finish(scope, key, task, ttl, generation))
+            self._calls[(scope, key)] = (generation, task)
+        return await asyncio.shield(task)
+
+    async def cancel(self, scope):
+        tasks = [task for (call_scope, _), (_, task) in self._calls.items()
+                 if call_scope is scope]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def forget(self):
+        self._generation += 1
+        self._memo.clear()
+
+    def _finish(self, scope, key, task, ttl, generation):
+        if self._calls.get((scope, key), (None, None))[1] is task:
+            del self._calls[(scope, key)]
+        if (ttl <= 0 or generation != self._generation or
+                task.cancelled() or task.exception() is not None):
+            return
+        now = time.monotonic()
+        if len(self._memo) >= 1000:
+            self._memo = {k: v for k, v in self._memo.items() if v[0] > now}
+        self._memo[key] = (now + ttl, task.result())
+
+    def stats(self):
+        hits = self.coalesced + self.memo_hits
+        return {
+            'requests': self.requests,
+            'calls': self.requests - hits,
+            'coalesced': self.coalesced,
+            'memo_hits': self.memo_hits,
+            'hit_rate': hits / self.requests if self.requests else 0.0
+        }
+
+
+class _TokenBucket:
+    """
+    Description
+    --------------------
+    A bucket holding up to burst tokens, refilled at per_minute
+    tokens per minute.
+    """
+
+    def __init__(self, per_minute, burst):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1, min(burst, per_minute))
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.capacity,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        return max(0.0, (1 - self.tokens) / self.rate)
+
+
+class _RateLimiter:
+    """
+    Description
+    --------------------
+    Token-bucket rate limiter shared by every sync and async call
+    of a Tenant. Each call takes a token from the tenant bucket and
+    from the bucket of the longest matching endpoint tier, if any.
+    Waiting calls are served in order of priority, then arrival,
+    skipping those whose tier bucket is empty.
+    """
+
+    def __init__(self, per_minute, burst, tiers):
+        self._bucket = _TokenBucket(per_minute, burst)
+        self._tiers = {prefix: _TokenBucket(tier_per_minute, burst)
+                       for prefix, tier_per_minute in tiers.items()}
+        self._condition = threading.Condition()
+        self._waiters = []
+        self._counter = itertools.count()
+        self.requests = 0
+        self.waited = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def _buckets(self, url):
+        endpoint = url.split('/api/v1/', 1)[-1]
+        buckets = [self._bucket]
+        prefixes = [prefix for prefix in self._tiers
+                    if endpoint.startswith(prefix)]
+        if prefixes:
+            buckets.append(self._tiers[max(prefixes, key=len)])
+        return buckets
+
+    def _take(self, ticket):
+        """
+        Takes a token from every bucket of ticket if it is the first
+        waiter whose buckets all have one, returning None. Otherwise
+        returns how long to wait before trying again. Waiters held
+        up by a bucket of their own do not hold up the others.
+        Requires the lock.
+        """
+
+        now = time.monotonic()
+        for waiter in self._waiters:
+            for bucket in waiter[3]:
+                bucket.refill(now)
+            if all(bucket.tokens >= 1 for bucket in waiter[3]):
+                break
+        else:
+            waiter = None
+
+        if waiter is not ticket:
+            return max(0.001, max(bucket.delay() for bucket in ticket[3]))
+
+        for bucket in ticket[3]:
+            bucket.tokens -= 1
+        self._waiters.remove(ticket)
+        self._condition.notify_all()
+
+        waited = now - ticket[2]
+        self.requests += 1
+        if waited > 0.001:
+            self.waited += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+        return None
+
+    def _enqueue(self, url, priority):
+        ticket = [_PRIORITIES[priority], next(self._counter),
+                  time.monotonic(), self._buckets(url)]
+        with self._condition:
+            bisect.insort(self._waiters, ticket)
+        return ticket
+
+    def _dequeue(self, ticket):
+        with self._condition:
+            if any(waiter is ticket for waiter in self._waiters):
+                self._waiters.remove(ticket)
+                self._condition.notify_all()
+
+    def acquire(self, url, priority):
+        ticket = self._enqueue(url, priority)
+        try:
+            with self._condition:
+                delay = self._take(ticket)
+                while delay is not None:
+                    self._condition.wait(delay)
+                    delay = self._take(ticket)
+        finally:
+            self._dequeue(ticket)
+
+    async def acquire_async(self, url, priority):
+        ticket = self._enqueue(url, priority)
+        try:
+            while True:
+                with self._condition:
+                    delay = self._take(ticket)
+                if delay is None:
+                    return
+                await asyncio.sleep(delay)
+        finally:
+            self._dequeue(ticket)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'queue_depth': len(self._waiters),
+                'requests': self.requests,
+                'waited': self.waited,
+                'total_wait': self.total_wait,
+                'max_wait': self.max_wait,
+                'average_wait': (self.total_wait / self.waited
+                                 if self.waited else 0.0)
+            }
+
+
+class _EngineSocket:
+    """
+    Description
+    --------------------
+    A JSON-RPC session with the QIX Engine over a websocket. Requests
+    are pipelined: they are all sent without waiting, and a reader
+    task matches each response to its request by id.
+    """
+
+    def __init__(self, ws):
+        self._ws = ws
+        self._ids = itertools.count(1)
+        self._pending = {}
+        self._reader = asyncio.ensure_future(self._read())
+
+    async def _read(self):
+        error = Exception('The engine closed the websocket')
+        try:
+            async for message in self._ws:
+                if message.type != WSMsgType.TEXT:
+                    break
+                response = json.loads(message.data)
+                future = self._pending.pop(response.get('id'), None)
+                if future is None or future.done():
+                    continue
+                if 'error' in response:
+                    future.set_exception(Exception(response['error']))
+                else:
+                    future.set_result(response.get('result'))
+        except Exception as e:
+            error = e
+        finally:
+            for future in self._pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self._pending.clear()
+
+    async def send(self, handle, method, params):
+        if self._reader.done():
+            raise Exception('The engine closed the websocket')
+        request_id = next(self._ids)
+        future = asyncio.get_event_loop().create_future()
+        self._pending[request_id] = future
+        await self._ws.send_str(json.dumps({
+            'jsonrpc': '2.0', 'id': request_id, 'handle': handle,
+            'method': method, 'params': params}))
+        return future
+
+    async def batch(self, calls):
+        futures = [await self.send(handle, method, params)
+                   for handle, method, params in calls]
+        return await asyncio.gather(*futures)
+
+    async def close(self):
+        await self._ws.close()
+        await self._reader
 
 
 class Tenant:
@@ -68,8 +615,14 @@ class Tenant:
 
         self.limit = 100
         self.suppress_warnings = False
-
-    def get(self, endpoint, params={}, headers={}):
+        self.single_flight_ttl = 1.0
+        self.http2 = False
+        self._rate_limiter = None
+        self.engine_url = self.tenant.replace('https://', 'wss://')
+        self._single_flight = _SingleFlight()
+
+    def get(self, endpoint, params={}, headers={}, fields=None,
+            result_format='list', priority='interactive'):
         """
         Description
         --------------------
@@ -83,6 +636,15 @@ class Tenant:
         --------------------
         params (dict)
         headers (dict)
+        fields (list), keyword param, dotted paths of the fields
+                       to keep, e.g. ['id', 'resourceAttributes.owner'].
+                       Everything else is dropped as each page is parsed.
+        result_format (str), keyword param, default 'list'. One of
+                             'list', 'columns' (dict of lists),
+                             'numpy', 'pandas' or 'arrow'. Every format
+                             other than 'list' requires fields.
+        priority (str), keyword param, default 'interactive',
+                        see set_rate_limit
 
         Example Usage
         --------------------
@@ -95,72 +657,500 @@ class Tenant:
             get('items', params={"resourceType":"app"})
 
             This will return all apps from items.
+
+        Example 3:
+            get('audits', fields=['id', 'eventType', 'eventTime'],
+                result_format='pandas')
+
+            This will return all audit events as a DataFrame with
+            three columns.
         """
 
+        _check_priority(priority)
+
+        if result_format not in _RESULT_FORMATS:
+            raise Exception('result_format must be one of',
+                            _RESULT_FORMATS)
+        if result_format != 'list' and not fields:
+            raise Exception('fields must be provided when result_format '
+                            'is "' + result_format + '"')
+
+        pages = self._get_pages(endpoint, params, headers, priority)
+        if result_format != 'list':
+            return _collect_columns(pages, fields, result_format)
+
+        result = []
+        for page in pages:
+            if not isinstance(page, list):
+                return _project(page, fields) if fields else page
+            if fields:
+                page = [_project(record, fields) for record in page]
+            result += page
+        return result
+
+    def get_iter(self, endpoint, params={}, headers={}, fields=None,
+                 priority='interactive'):
+        """
+        Description
+        --------------------
+        Streaming variant of get. Yields one result at a time,
+        fetching the next page only once the current one has been
+        consumed.
+
+        Mandatory parameters
+        --------------------
+        endpoint (str), exclude api/{version}
+
+        Optional parameters
+        --------------------
+        params (dict)
+        headers (dict)
+        fields (list), keyword param, see get
+        priority (str), keyword param, default 'interactive',
+                        see set_rate_limit
+
+        Example Usage
+        --------------------
+        Example:
+            for event in get_iter('audits', fields=['id', 'eventType']):
+                print(event['eventType'])
+        """
+
+        _check_priority(priority)
+        return self._iter_records(endpoint, params, headers, fields,
+                                  priority)
+
+    def _iter_records(self, endpoint, params, headers, fields, priority):
+        """
+        Description
+        --------------------
+        Private generator for get_iter.
+        """
+
+        for page in self._get_pages(endpoint, params, headers, priority):
+            if not isinstance(page, list):
+                page = [page]
+            for record in page:
+                yield _project(record, fields) if fields else record
+
+    def _get_pages(self, endpoint, params, headers, priority):
+        """
+        Description
+        --------------------
+        Private generator for get and get_iter. Yields the data of
+        each page, or the whole response body if it isn't paginated.
+        """
+
+        params = dict(params)
         params['limit'] = self.limit
-        s = requests.Session()
+        s = self._session()
         s.headers.update(self.auth_header)
 
         if len(headers) > 0:
             s.headers.update(headers)
 
-        next_re = r'(?<=&next=)(?:(?!&|$).)*'
-        next_name = 'next'
-        starting_after = None
-        result = []
         try:
-            r = s.get(self.tenant + '/api/v1/' + endpoint, params=params)
-            if r.status_code == 200:
-                result = r.json()
-                if 'data' in result:
-                    result = result['data']
-                try:
-                    starting_after = re.findall(
-                        next_re, r.json()['links']['next']['href'])[0]
-                except IndexError:
-                    try:
-                        next_re = r'(?<=&startingAfter=)(?:(?!&|$).)*'
-                        starting_after = re.findall(
-                            next_re, r.json()['links']['next']['href'])[0]
-                        next_name = 'startingAfter'
-                    except IndexError:
-                        params.clear()
-                        return result
-                except KeyError:
-                    try:
-                        starting_after = re.findall(
-                            next_re, r.json()['links']['Next']['Href'])[0]
-                    except IndexError:
-                        try:
-                            next_re = r'(?<=&startingAfter=)(?:(?!&|$).)*'
-                            starting_after = re.findall(
-                                next_re, r.json()['links']['Next']['Href'])[0]
-                            next_name = 'startingAfter'
-                        except IndexError:
-                            params.clear()
-                            return result
+            while True:
+                self._throttle(self.tenant + '/api/v1/' + endpoint, priority)
+                r = s.get(self.tenant + '/api/v1/' + endpoint, params=params)
+                if r.status_code != 200:
+                    raise Exception(r.status_code, r.text)
+                body = r.json()
+                if isinstance(body, dict) and 'data' in body:
+                    yield body['data']
+                else:
+                    yield body
+                cursor = _next_cursor(body)
+                if cursor is None:
+                    break
+                params[cursor[0]] = cursor[1]
+        finally:
+            s.close()
+
+    def get_partitioned(self, endpoint, start, end, partitions=4,
+                        window_param='eventTime',
+                        window_format='{start}/{end}',
+                        time_field='eventTime', id_field='id',
+                        min_window=datetime.timedelta(minutes=1),
+                        chunks=10, params={}, headers={}, fields=None,
+                        result_format='list', priority='background'):
+        """
+        Description
+        --------------------
+        GETs all results within a time range by splitting it into
+        windows and paginating each window asynchronously. While
+        fewer than chunks windows are being paginated, windows
+        whose first page shows that they hold more than one page
+        are split in half again, down to min_window. Results are
+        merged in ascending order of time_field, without duplicates.
 
+        Only use this on endpoints that can filter on a time range.
+
+        Mandatory parameters
+        --------------------
+        endpoint (str), exclude api/{version}
+        start (datetime), naive datetimes are taken as UTC
+        end (datetime)
+
+        Optional parameters
+        --------------------
+        partitions (int), keyword param, default 4, the initial
+                          amount of windows
+        window_param (str), keyword param, default 'eventTime',
+                            the param that filters on the range
+        window_format (str), keyword param, default '{start}/{end}',
+                             formatted with the ISO start and end
+                             of each window
+        time_field (str), keyword param, default 'eventTime'
+        id_field (str), keyword param, default 'id', records
+                          without it are never deduplicated
+        min_window (timedelta), keyword param, default 1 minute,
+                                windows longer than this may be split
+                                when they hold more than one page,
+                                which costs one extra call per split
+                                as their first page is discarded
+        chunks (int), keyword param, default 10, also the most
+                      windows that are split into
+        params (dict), keyword param
+        headers (dict), keyword param
+        fields (list), keyword param, see get
+        result_format (str), keyword param, see get
+        priority (str), keyword param, default 'background',
+                        see set_rate_limit
+
+        Example Usage
+        --------------------
+        Example 1:
+            get_partitioned('audits', datetime(2021, 1, 1),
+                            datetime(2021, 1, 31), partitions=30)
+
+            This will return all audit events of January 2021,
+            starting with one window per day.
+
+        Example 2:
+            get_partitioned('reloads', datetime(2021, 1, 1),
+                            datetime(2021, 1, 31), window_param='filter',
+                            window_format='creationTime ge "{start}" and '
+                                          'creationTime lt "{end}"',
+                            time_field='creationTime')
+        """
+
+        _check_priority(priority)
+
+        if result_format not in _RESULT_FORMATS:
+            raise Exception('result_format must be one of',
+                            _RESULT_FORMATS)
+        if result_format != 'list' and not fields:
+            raise Exception('fields must be provided when result_format '
+                            'is "' + result_format + '"')
+        if end <= start or partitions < 1:
+            raise Exception('end must be after start, and partitions >= 1')
+
+        live = [partitions]
+
+        def keep(page):
+            return [(record.get(time_field) or '', record.get(id_field),
+                     _project(record, fields) if fields else record)
+                    for record in page]
+
+        async def crawl(sem, session, url, window_start, window_end,
+                        headers):
+            window_params = dict(params)
+            window_params['limit'] = self.limit
+            window_params[window_param] = window_format.format(
+                start=_isoformat(window_start), end=_isoformat(window_end))
+
+            body = await self._async_read(sem, session, url, window_params,
+                                          headers, priority)
+            cursor = _next_cursor(body)
+            if (cursor is not None and live[0] < chunks and
+                    window_end - window_start > min_window):
+                live[0] += 1
+                middle = window_start + (window_end - window_start) / 2
+                halves = await asyncio.gather(
+                    crawl(sem, session, url, window_start, middle, headers),
+                    crawl(sem, session, url, middle, window_end, headers))
+                return halves[0] + halves[1]
+
+            try:
+                records = keep(body['data'])
+                while cursor is not None:
+                    window_params[cursor[0]] = cursor[1]
+                    body = await self._async_read(sem, session, url,
+                                                  window_params, headers,
+                                                  priority)
+                    records += keep(body['data'])
+                    cursor = _next_cursor(body)
+            finally:
+                live[0] -= 1
+            records.sort(key=lambda record: record[0])
+            return records
+
+        async def run(chunks, headers):
+            url = self.tenant + '/api/v1/' + endpoint
+            request_headers = dict(self.auth_header)
+            request_headers.update(headers)
+
+            step = (end - start) / partitions
+            bounds = [start + step * i for i in range(partitions)] + [end]
+            sem = asyncio.Semaphore(chunks)
+
+            async with self._client_session() as session:
+                tasks = [asyncio.ensure_future(
+                    crawl(sem, session, url, bounds[i], bounds[i + 1],
+                          request_headers)) for i in range(partitions)]
+                return await self._gather_reads(session, tasks)
+
+        loop = asyncio.get_event_loop()
+        future = asyncio.ensure_future(run(chunks, headers))
+        windows = loop.run_until_complete(future)
+
+        seen = set()
+        result = []
+        for window in windows:
+            for _, record_id, record in window:
+                if record_id is not None:
+                    if record_id in seen:
+                        continue
+                    seen.add(record_id)
+                result.append(record)
+
+        if result_format != 'list':
+            return _collect_columns([result], fields, result_format)
+        return result
+
+    def async_get(self, endpoint, ids=[], chunks=10, params={},
+                  headers={}, priority='background'):
+        """
+        Description
+        --------------------
+        Asynchronously GETs objects with IDs from arbitrary
+        endpoints, returning the results in the order of ids.
+        The default number of asynchronous operations is set to 10.
+
+        Concurrent identical GETs are only sent once and share
+        their result, which is also reused for single_flight_ttl
+        seconds (default 1, 0 disables it). Duplicate ids therefore
+        cost a single call. See single_flight_stats.
+
+        Mandatory parameters
+        --------------------
+        endpoint (str), exclude api/{version}
+
+        Optional parameters
+        --------------------
+        ids (list), keyword param
+        chunks (int), keyword param, default 10
+        params (dict), keyword param
+        headers (dict), keyword param
+        priority (str), keyword param, default 'background',
+                        see set_rate_limit
+
+        Example Usage
+        --------------------
+        Example:
+            apps = get('items', params={"resourceType": "app"})
+            owners = async_get('users', ids=[app['ownerId']
+                                             for app in apps])
+        """
+
+        _check_priority(priority)
+
+        async def run(endpoint, ids, chunks, headers):
+            if len(ids) > 0:
+                url = self.tenant + '/api/v1/' + endpoint + '/'
+                request_headers = dict(self.auth_header)
+                request_headers.update(headers)
+                sem = asyncio.Semaphore(chunks)
+
+                async with self._client_session() as session:
+                    tasks = [asyncio.ensure_future(
+                        self._async_read(sem, session, url + element_id,
+                                         params, request_headers, priority))
+                             for element_id in ids]
+                    return await self._gather_reads(session, tasks)
             else:
-                params.clear()
-                raise Exception(r.status_code, r.text)
-            while r.status_code == 200 and starting_after:
-                params[next_name] = starting_after
-                r = s.get(self.tenant + '/api/v1/' + endpoint, params=params)
-                result += r.json()['data']
+                raise Exception(
+                    'No ids were provided, ensure ids=[] is provided')
+
+        loop = asyncio.get_event_loop()
+        future = asyncio.ensure_future(run(endpoint, ids, chunks, headers))
+        return loop.run_until_complete(future)
+
+    def async_app_metadata(self, app_ids=[], objects=_ENGINE_OBJECTS,
+                           chunks=10, no_data=True, headers={},
+                           priority='background'):
+        """
+        Description
+        --------------------
+        Asynchronously gets metadata of many apps from the QIX
+        Engine, opening one websocket per app, chunks at a time
+        (default 10). All requests to an app are pipelined over
+        its websocket. Apps that could not be scanned map to the
+        Exception that was raised instead.
+
+        Mandatory parameters
+        --------------------
+        app_ids (list), keyword param
+
+        Optional parameters
+        --------------------
+        objects (list), keyword param, any of 'sheets', 'measures',
+                        'dimensions', 'data_model' and 'script',
+                        default all
+        chunks (int), keyword param, default 10
+        no_data (bool), keyword param, default True, opens the
+                        apps without loading their data
+        headers (dict), keyword param
+        priority (str), keyword param, default 'background',
+                        see set_rate_limit
+
+        Example Usage
+        --------------------
+        Example:
+            apps = get('items', params={"resourceType": "app"})
+            metadata = async_app_metadata(
+                app_ids=[app['resourceId'] for app in apps],
+                objects=['sheets', 'measures'])
+
+            for app_id in metadata:
+                print(app_id, len(metadata[app_id]['sheets']))
+        """
+
+        _check_priority(priority)
+
+        unknown = set(objects) - set(_ENGINE_OBJECTS)
+        if unknown:
+            raise Exception('objects must be any of', _ENGINE_OBJECTS)
+
+        async def call(session, app_id, headers):
+            url = self.engine_url + '/app/' + app_id
+            await self._async_throttle(url, priority)
+            ws = await session.ws_connect(url, headers=headers)
+            engine = _EngineSocket(ws)
+            try:
+                doc = (await engine.batch([
+                    (-1, 'OpenDoc', {'qDocName': app_id,
+                                     'qNoData': no_data})]))[0]
+                handle = doc['qReturn']['qHandle']
+
+                calls = []
+                for name in objects:
+                    if name in _ENGINE_LISTS:
+                        calls.append((handle, 'CreateSessionObject',
+                                      [_ENGINE_LISTS[name][1]]))
+                    elif name == 'data_model':
+                        calls.append((handle, 'GetTablesAndKeys', {
+                            'qWindowSize': {'qcx': 0, 'qcy': 0},
+                            'qNullSize': {'qcx': 0, 'qcy': 0},
+                            'qCellHeight': 0,
+                            'qSyntheticMode': False,
+                            'qIncludeSysVars': False}))
+                    else:
+                        calls.append((handle, 'GetScript', []))
+                results = await engine.batch(calls)
+
+                layouts = await engine.batch(
+                    [(result['qReturn']['qHandle'], 'GetLayout', [])
+                     for name, result in zip(objects, results)
+                     if name in _ENGINE_LISTS])
+                layouts = iter(layouts)
+
+                metadata = {}
+                for name, result in zip(objects, results):
+                    if name in _ENGINE_LISTS:
+                        layout = next(layouts)['qLayout']
+                        metadata[name] = layout[_ENGINE_LISTS[name][0]][
+                            'qItems']
+                    elif name == 'data_model':
+                        metadata[name] = {'tables': result['qtr'],
+                                          'keys': result['qk']}
+                    else:
+                        metadata[name] = result['qScript']
+                return metadata
+            finally:
+                await engine.close()
+
+        async def bound_call(sem, session, app_id, headers):
+            async with sem:
                 try:
-                    starting_after = re.findall(
-                        next_re, r.json()['links']['next']['href'])[0]
-                except KeyError:
-                    starting_after = re.findall(
-                        next_re, r.json()['links']['Next']['Href'])[0]
-        except KeyError:
-            pass
-        except TypeError:
-            params.clear()
-            return result
-        s.close()
-        params.clear()
-        return result
+                    return await call(session, app_id, headers)
+                except Exception as e:
+                    return e
+
+        async def run(app_ids, chunks, headers):
+            if len(app_ids) > 0:
+                request_headers = dict(self.auth_header)
+                request_headers.update(headers)
+                sem = asyncio.Semaphore(chunks)
+
+                async with ClientSession() as session:
+                    tasks = [asyncio.ensure_future(
+                        bound_call(sem, session, app_id, request_headers))
+                             for app_id in app_ids]
+                    return await asyncio.gather(*tasks)
+            else:
+                raise Exception(
+                    'No app_ids were provided, ensure app_ids=[] is '
+                    'provided')
+
+        loop = asyncio.get_event_loop()
+        future = asyncio.ensure_future(run(app_ids, chunks, headers))
+        return dict(zip(app_ids, loop.run_until_complete(future)))
+
+    def single_flight_stats(self):
+        """
+        Description
+        --------------------
+        Returns how many async reads were requested, how many
+        of them were sent, and how many were instead served by
+        an identical in-flight call (coalesced) or the short-lived
+        memo (memo_hits), along with the resulting hit_rate.
+        """
+
+        return self._single_flight.stats()
+
+    async def _async_read(self, sem, session, url, params, headers,
+                          priority):
+        """
+        Description
+        --------------------
+        Private helper for the async GETs. Coalesces identical
+        concurrent reads, only holding sem while actually calling.
+        Every caller parses its own copy of the shared response.
+        """
+
+        async def call():
+            async with sem:
+                await self._async_throttle(url, priority)
+                async with session.get(url, params=params,
+                                       headers=headers) as resp:
+                    response = await resp.text()
+                    if resp.status != 200:
+                        raise Exception(resp.status, response)
+                    return response
+
+        key = ('get', url, tuple(sorted(params.items())),
+               tuple(sorted(headers.items())))
+        return json.loads(await self._single_flight.do(
+            key, call, self.single_flight_ttl, session))
+
+    async def _gather_reads(self, session, tasks):
+        """
+        Description
+        --------------------
+        Private helper that gathers tasks reading through session.
+        If one of them fails, the others and their in-flight calls
+        are cancelled before the session can be closed.
+        """
+
+        try:
+            return await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await self._single_flight.cancel(session)
+            await asyncio.gather(*tasks, return_exceptions=True)
 
     def delete(self, endpoint, headers={}):
         """
@@ -184,13 +1174,15 @@ class Tenant:
             This deletes an item with the corresponding Id.
         """
 
-        s = requests.Session()
+        s = self._session()
         s.headers.update(self.auth_header)
 
         if len(headers) > 0:
             s.headers.update(headers)
 
+        self._throttle(self.tenant + '/api/v1/' + endpoint)
         r = s.delete(self.tenant + '/api/v1/' + endpoint)
+        self._single_flight.forget()
         if r.status_code in range(200, 300):
             try:
                 result = r.json()
@@ -292,7 +1284,7 @@ class Tenant:
         return self._generic('patch', endpoint, body, params, headers)
 
     def async_app_copy(self, app_id, copies=1, chunks=10, users=[],
-                       headers={}):
+                       headers={}, priority='background'):
         """
         Description
         --------------------
@@ -310,6 +1302,8 @@ class Tenant:
         chunks (int), keyword param, default 10
         users (list), keyword param
         headers (dict), keyword param
+        priority (str), keyword param, default 'background',
+                        see set_rate_limit
 
         Example Usage
         --------------------
@@ -332,10 +1326,15 @@ class Tenant:
             This would copy an app 10 times, retaining the original owner.
         """
 
+        _check_priority(priority)
+
         async def call(url, session, app_id, user_id, headers):
+            await self._async_throttle(url + 'apps/' + app_id + '/copy',
+                                       priority)
             async with session.post(url + 'apps/' + app_id + '/copy',
                                     headers=headers) as resp:
                 response = await resp.text()
+                self._single_flight.forget()
                 if resp.status not in range(200, 300):
                     raise Exception(resp.status, response)
 
@@ -352,19 +1351,24 @@ class Tenant:
                     "resourceCreatedBySubject": attributes['owner']
                 }
 
+            await self._async_throttle(url + 'items', priority)
             async with session.post(url + 'items', data=json.dumps(payload),
                                     headers=headers) as resp:
                 response = await resp.text()
+                self._single_flight.forget()
                 if resp.status not in range(200, 300):
                     raise Exception(resp.status, response)
                 return response
 
             if user_id:
+                await self._async_throttle(url + 'apps/' + copied_app_id +
+                                           '/owner', priority)
                 async with session.put(url + 'apps/' + copied_app_id +
                                        '/owner',
                                        data=json.dumps({"ownerId": user_id}),
                                        headers=headers) as resp:
                     response = await resp.text()
+                    self._single_flight.forget()
                     if resp.status not in range(200, 300):
                         raise Exception(resp.status, response)
                     return response
@@ -385,7 +1389,7 @@ class Tenant:
 
             sem = asyncio.Semaphore(chunks)
 
-            async with ClientSession() as session:
+            async with self._client_session() as session:
                 if len(users) > 0:
                     for user_id in users:
                         for i in range(copies):
@@ -411,7 +1415,8 @@ class Tenant:
             run(app_id, copies, chunks, users, headers))
         loop.run_until_complete(future)
 
-    def async_delete(self, endpoint, ids=[], chunks=10, headers={}):
+    def async_delete(self, endpoint, ids=[], chunks=10, headers={},
+                     priority='background'):
         """
         Description
         --------------------
@@ -428,6 +1433,8 @@ class Tenant:
         ids (list), keyword param
         chunks (int), keyword param, default 10
         headers (dict), keyword param
+        priority (str), keyword param, default 'background',
+                        see set_rate_limit
 
         Example Usage
         --------------------
@@ -435,10 +1442,14 @@ class Tenant:
             async_delete('users', ids=['<GUID1>','<GUID2>'])
         """
 
+        _check_priority(priority)
+
         async def call(url, session, headers):
+            await self._async_throttle(url, priority)
             async with session.delete(url,
                                       headers=headers) as resp:
                 response = await resp.text()
+                self._single_flight.forget()
                 if resp.status not in range(200, 300):
                     raise Exception(resp.status, response)
                 return response
@@ -458,7 +1469,7 @@ class Tenant:
 
                 sem = asyncio.Semaphore(chunks)
 
-                async with ClientSession() as session:
+                async with self._client_session() as session:
                     for element_id in ids:
                         task = asyncio.ensure_future(
                             bound_call(sem, url + element_id, session,
@@ -476,7 +1487,8 @@ class Tenant:
         loop.run_until_complete(future)
 
     def async_post(self, endpoint, payloads=[], replace_char='',
-                   replace_ids=[], chunks=10, headers={}):
+                   replace_ids=[], chunks=10, headers={},
+                   priority='background'):
         """
         Description
         --------------------
@@ -517,6 +1529,8 @@ class Tenant:
                             per-call in the endpoint URL
         chunks (int),   keyword param, default 10
         headers (dict), keyword param
+        priority (str), keyword param, default 'background',
+                        see set_rate_limit
 
         Example Usage
         --------------------
@@ -528,10 +1542,11 @@ class Tenant:
         """
 
         return self._async_generic('post', endpoint, payloads, replace_char,
-                                   replace_ids, chunks, headers)
+                                   replace_ids, chunks, headers, priority)
 
     def async_put(self, endpoint, payloads=[], replace_char='',
-                  replace_ids=[], chunks=10, headers={}):
+                  replace_ids=[], chunks=10, headers={},
+                  priority='background'):
         """
         Description
         --------------------
@@ -546,10 +1561,11 @@ class Tenant:
         """
 
         return self._async_generic('put', endpoint, payloads, replace_char,
-                                   replace_ids, chunks, headers)
+                                   replace_ids, chunks, headers, priority)
 
     def async_patch(self, endpoint, payloads=[], replace_char='',
-                    replace_ids=[], chunks=10, headers={}):
+                    replace_ids=[], chunks=10, headers={},
+                    priority='background'):
         """
         Description
         --------------------
@@ -564,21 +1580,25 @@ class Tenant:
         """
 
         return self._async_generic('patch', endpoint, payloads, replace_char,
-                                   replace_ids, chunks, headers)
+                                   replace_ids, chunks, headers, priority)
 
     def _async_generic(self, method, endpoint, payloads, replace_char,
-                       replace_ids, chunks, headers):
+                       replace_ids, chunks, headers, priority):
         """
         Description
         --------------------
         Helper function for async_post, async_patch, async_put
         """
 
+        _check_priority(priority)
+
         async def call(method, url, session, payload, headers):
             func = 'session.' + method
+            await self._async_throttle(url, priority)
             async with eval(func)(url, data=payload,
                                   headers=headers) as resp:
                 response = await resp.text()
+                self._single_flight.forget()
                 if resp.status not in range(200, 300):
                     raise Exception(resp.status, response)
                 return response
@@ -605,7 +1625,7 @@ class Tenant:
                 auth_header.update(headers)
                 headers = auth_header
 
-                async with ClientSession() as session:
+                async with self._client_session() as session:
 
                     if fill_urls:
                         if len(replace_ids) == len(payloads):
@@ -644,6 +1664,115 @@ class Tenant:
                                            headers))
         loop.run_until_complete(future)
 
+    def set_rate_limit(self, per_minute, burst=10, tiers={}):
+        """
+        Description
+        --------------------
+        Limits the rate of calls made by this Tenant, across all
+        functions and whether they are sync or async, using a token
+        bucket. Calls that would exceed it wait for their turn,
+        where sync calls (get, post, put, patch, delete) go ahead
+        of the async and partitioned functions, which are treated
+        as background work, unless told otherwise with priority.
+
+        Mandatory parameters
+        --------------------
+        per_minute (int), calls per minute for the whole tenant,
+                          or None to remove the limit
+
+        Optional parameters
+        --------------------
+        burst (int), keyword param, default 10, how many calls
+                     can be made at once after being idle
+        tiers (dict), keyword param, a stricter per_minute limit for
+                      endpoints starting with a given prefix, on top
+                      of the tenant limit
+
+        get, get_iter, get_partitioned and the async functions take
+        a priority keyword param, either 'interactive' or
+        'background'. Waiting interactive calls go ahead of
+        background ones. It defaults to 'interactive' for get and
+        get_iter, and to 'background' for the others. post, put,
+        patch and delete are always interactive.
+
+        Example Usage
+        --------------------
+        Example:
+            set_rate_limit(1000, tiers={'apps/import': 100})
+
+            This will allow 1000 calls per minute, of which at
+            most 100 to apps/import.
+        """
+
+        if per_minute is None:
+            self._rate_limiter = None
+        elif per_minute <= 0 or any(tier_per_minute <= 0
+                                    for tier_per_minute in tiers.values()):
+            raise Exception('per_minute and the tiers must be > 0')
+        else:
+            self._rate_limiter = _RateLimiter(per_minute, burst, tiers)
+
+    def rate_limit_stats(self):
+        """
+        Description
+        --------------------
+        Returns the amount of calls currently waiting for the rate
+        limit (queue_depth), the amount of calls made and of those
+        that had to wait, and their total, max and average wait
+        in seconds. Returns None if there is no rate limit.
+        """
+
+        if self._rate_limiter is None:
+            return None
+        return self._rate_limiter.stats()
+
+    def _throttle(self, url, priority='interactive'):
+        """
+        Description
+        --------------------
+        Private helper that blocks until url may be called under
+        the rate limit, if one is set.
+        """
+
+        if self._rate_limiter is not None:
+            self._rate_limiter.acquire(url, priority)
+
+    async def _async_throttle(self, url, priority='background'):
+        """
+        Description
+        --------------------
+        Private helper that waits until url may be called under
+        the rate limit, if one is set.
+        """
+
+        if self._rate_limiter is not None:
+            await self._rate_limiter.acquire_async(url, priority)
+
+    def _session(self):
+        """
+        Description
+        --------------------
+        Private helper that returns a requests.Session, or an
+        httpx.Client speaking HTTP/2 if http2 is set.
+        """
+
+        if self.http2:
+            return _import_httpx().Client(http2=True, timeout=None,
+                                          follow_redirects=True)
+        return requests.Session()
+
+    def _client_session(self):
+        """
+        Description
+        --------------------
+        Private helper that returns an aiohttp ClientSession, or an
+        httpx.AsyncClient speaking HTTP/2 if http2 is set.
+        """
+
+        if self.http2:
+            return _HTTPXSession(_import_httpx())
+        return ClientSession()
+
     def _generic_request(self, s, method, endpoint, body, params, headers,
                          json=False):
         """
@@ -670,13 +1799,20 @@ class Tenant:
         if len(headers) > 0:
             s.headers.update(headers)
 
-        if not json:
+        self._throttle(self.tenant + '/api/v1/' + endpoint)
+        if not json and self.http2 and not isinstance(body, dict):
+            if isinstance(body, MultipartEncoder):
+                body = body.to_string()
+            r = eval(func)(self.tenant + '/api/v1/' + endpoint,
+                           params=params, content=body)
+        elif not json:
             r = eval(func)(self.tenant + '/api/v1/' + endpoint,
                            params=params, data=body)
         else:
             r = eval(func)(self.tenant + '/api/v1/' +
                            endpoint, params=params, json=body)
 
+        self._single_flight.forget()
         return r
 
     def _generic(self, method, endpoint, body, params, headers):
@@ -687,7 +1823,7 @@ class Tenant:
         """
         flag_400 = False
         flag_500 = False
-        s = requests.Session()
+        s = self._session()
         s.headers.update(self.auth_header)
 
         r = self._generic_request(s, method, endpoint, body, params, headers)
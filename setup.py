@@ -24,6 +24,12 @@ setup(
         'aiohttp',
         'asyncio',
     ],
+    extras_require={
+        'numpy': ['numpy'],
+        'pandas': ['pandas'],
+        'arrow': ['pyarrow'],
+        'http2': ['httpx[http2,brotli]'],
+    },
     python_requires='>=3.5',
     classifiers=[
         'Development Status :: 5 - Production/Stable',